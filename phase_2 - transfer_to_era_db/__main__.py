@@ -1,26 +1,37 @@
 # START OF FILE __main__.py
 
+import re
+import sys
 import json
+import functools
+import operator
 import pandas as pd
 import asyncio
 import unicodedata # <--- ADDED: Essential for handling accents correctly
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from alive_progress import alive_bar
 from bson import ObjectId
 
 from mango.db_handler import MongoDirect as mp
 from mango.cli import args
-from mango.spoon import process_field
+from mango.spoon import process_field, split_series
 from mango.config import  relations, column2type, properties, delimited_fields, prefix_map, database
 
+try:
+    import orjson # Much faster JSON (de)serialization for the output caches
+except ImportError:
+    orjson = None
+
 BATCH_SIZE = 1000
 
 def load_json_cache(filename, default_factory):
     if filename.exists():
-        with open(filename, "r") as infile:
+        with open(filename, "rb") as infile:
             try:
-                loaded_data = json.load(infile)
+                raw = infile.read()
+                loaded_data = orjson.loads(raw) if orjson else json.loads(raw)
                 cache = defaultdict(default_factory)
                 
                 is_nested_defaultdict = isinstance(default_factory(), defaultdict)
@@ -28,7 +39,9 @@ def load_json_cache(filename, default_factory):
                 for key, value in loaded_data.items():
                     if is_nested_defaultdict and isinstance(value, dict):
                         inner_dd = default_factory()
-                        inner_dd.update(value)
+                        # Inner JSON lists are rebuilt as the in-memory container type (e.g. set).
+                        container = inner_dd.default_factory
+                        inner_dd.update({k: container(v) for k, v in value.items()})
                         cache[key] = inner_dd
                     else:
                         cache[key] = value
@@ -39,6 +52,61 @@ def load_json_cache(filename, default_factory):
                 print(f"Warning: {filename.name} is empty or corrupted. Starting with a new cache.")
     return defaultdict(default_factory)
 
+def dump_json_cache(filename, data, indent=True):
+    if orjson:
+        with open(filename, "wb") as outfile:
+            outfile.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(filename, "w") as outfile:
+            json.dump(data, outfile, indent=2 if indent else None)
+
+def read_workbook(path):
+    """
+    Reads every sheet of the Excel file and concatenates them.
+    Uses the much faster calamine engine when python-calamine is installed.
+    """
+    try:
+        xls = pd.ExcelFile(path, engine="calamine")
+    except (ImportError, ValueError):
+        xls = pd.ExcelFile(path)
+
+    with xls:
+        if xls.engine != "calamine":
+            # openpyxl holds the GIL while parsing, threads gain nothing there.
+            return pd.concat([xls.parse(sheet_name) for sheet_name in xls.sheet_names], ignore_index=True)
+        sheet_names = xls.sheet_names
+
+    # Each worker opens its own reader, a single workbook handle is not thread-safe.
+    def parse(sheet_name):
+        return pd.read_excel(path, sheet_name=sheet_name, engine="calamine")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(sheet_names)))) as ex:
+        frames = list(ex.map(parse, sheet_names))
+    return pd.concat(frames, ignore_index=True)
+
+# Maps the whitespace characters that break matching to plain spaces in one pass.
+_WS_TABLE = str.maketrans({'\n': ' ', '\r': ' ', '\t': ' '})
+
+
+@functools.lru_cache(maxsize=None)
+def _normalize_str(s):
+    """
+    Cached string branch of normalize_value. The same IDs and names repeat across
+    rows and relations, so most calls end up as a single dictionary lookup.
+    """
+    clean_v = s.translate(_WS_TABLE)
+    try:
+        # Try converting to float to catch numbers stored as text
+        f = float(clean_v.strip())
+        val_str = str(int(f)) if f.is_integer() else str(f)
+    except (ValueError, TypeError):
+        val_str = clean_v
+
+    # Final strip and Unicode Normalization (NFC)
+    # This ensures 'moïse' (composed) matches 'moïse' (decomposed)
+    return unicodedata.normalize('NFC', val_str).strip()
+
+
 def normalize_value(v):
     """
     Standardizes values to strings, handles floats/ints, removes extra whitespace,
@@ -47,66 +115,103 @@ def normalize_value(v):
     if pd.isnull(v) or v == "":
         return None
 
-    val_str = ""
-    
     if isinstance(v, (int, float)):
         if v == int(v):
-            val_str = str(int(v))
-        else:
-            val_str = str(v)
-    else:
-        # Handle strings and potential numpy types
-        try:
-            clean_v = str(v).replace('\n', ' ').replace('\r', ' ').replace('\t', ' ').strip()
-            # Try converting to float to catch numbers stored as text
-            f = float(clean_v)
-            val_str = str(int(f)) if f.is_integer() else str(f)
-        except (ValueError, TypeError):
-            val_str = str(v).replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+            return str(int(v))
+        return str(v)
 
-    # Final strip and Unicode Normalization (NFC)
-    # This ensures 'moïse' (composed) matches 'moïse' (decomposed)
-    return unicodedata.normalize('NFC', val_str).strip()
+    # Handle strings and potential numpy types
+    return _normalize_str(str(v))
+
+
+def normalize_series(s):
+    """
+    normalize_value for a whole Series, called once per distinct value instead of
+    once per cell. Values that normalize to nothing become <NA>.
+    """
+    # Going through normalize_value itself keeps the float() parsing of numbers:
+    # pd.to_numeric rounds long IDs differently and its overflow handling depends
+    # on the pandas version.
+    codes, uniques = pd.factorize(s)
+    normalized = pd.array([normalize_value(v) or None for v in uniques], dtype="string")
+    return pd.Series(normalized.take(codes, allow_fill=True), index=s.index)
+
+
+def normalize_column(series):
+    """
+    Normalizes a whole column at once and drops the values that normalize to nothing.
+    """
+    return normalize_series(series).dropna()
+
+
+def explode_column(data, column_name):
+    """
+    Splits every non-null cell of a column into its individual items and returns
+    them normalized, one per line, indexed by the row they came from.
+    """
+    # str() per cell, as process_field did: astype(str) prints midnight datetimes
+    # as bare dates. The object cast keeps an all-empty column a string Series.
+    items = data[column_name].dropna().astype(object).map(str)
+    items = split_series(items, delimiter=delimited_fields.get(column_name))
+    return normalize_column(items)
+
+
+def pair_columns(*columns):
+    """
+    Builds the row-wise cartesian product of exploded columns (what a nested loop
+    over each row's items would produce) and drops the repeated combinations.
+    """
+    pairs = columns[0].rename(0).to_frame()
+    for i, column in enumerate(columns[1:], start=1):
+        pairs = pairs.join(column.rename(i), how="inner")
+    return pairs.drop_duplicates()
+
+
+# Define the set of columns that are dynamically typed based on value prefixes.
+DYNAMICALLY_TYPED_COLUMNS = frozenset({
+    "PERSON_CHARACTER_ID_A",
+    "PERSON_CHARACTER_ID_B",
+    "HYPOTHESIS_ABOUT_ID(S)",
+    "MENTIONING_ID",
+    "MENTIONED_ID",
+    "AUTHOR_WORK_ID",
+    "OTHER_SECONDARY_ROLE_ID",
+    "TRANSLATOR_ID",
+    "EDITOR_ID",
+    "SCRIPTWRITER_ID",
+    "COMPOSITOR_ID",
+    "REVIEWER_ID",
+    "PUBLISHER_MANIFESTATION_ID",
+    "EDITOR_MANIFESTATION_ID",
+    "CORRECTOR_MANIFESTATION_ID",
+    "SPONSOR_MANIFESTATION_ID",
+    "OWNER_OF_ITEM_ID",
+    "OWNERSHIP_OF_VISUAL_ID",
+    "INSCRIBER_VISUAL_ID",
+    "SENDER_VISUAL_ID",
+    "RECIPIENT_VISUAL_ID",
+    "OWNERSHIP_OF_PHYSICAL_OBJECT_ID",
+    "CREATOR_OF_PHYSICAL_OBJECT_ID",
+})
+DYNAMICALLY_TYPED_SUFFIXES = ("_MENTIONING", "_MENTIONED_BY", "_HYPOTHESIS_OF")
+
+# Prefixes are fixed at startup, so they are compiled once into a single anchored
+# regex. Longest first, so 'm_vol_' wins over 'm_' and 'ex_' over 'e_'.
+_PREFIX_ITEMS = tuple(sorted(
+    ((prefix.lower(), entity_type) for prefix, entity_type in prefix_map.items()),
+    key=lambda x: -len(x[0])
+))
+_PREFIX_TYPES = dict(_PREFIX_ITEMS)
+_PREFIX_RE = re.compile('^(' + '|'.join(re.escape(p) for p, _ in _PREFIX_ITEMS) + ')', re.IGNORECASE)
 
 
 def get_dynamic_entity_type(column_name, value, default_mapping):
-    str_value = str(value)
-    
-    # Define the set of columns that are dynamically typed based on value prefixes.
-    dynamically_typed_columns = {
-        "PERSON_CHARACTER_ID_A", 
-        "PERSON_CHARACTER_ID_B", 
-        "HYPOTHESIS_ABOUT_ID(S)", 
-        "MENTIONING_ID", 
-        "MENTIONED_ID", 
-        "AUTHOR_WORK_ID",
-        "OTHER_SECONDARY_ROLE_ID",
-        "TRANSLATOR_ID",
-        "EDITOR_ID",
-        "SCRIPTWRITER_ID",
-        "COMPOSITOR_ID",
-        "REVIEWER_ID",
-        "PUBLISHER_MANIFESTATION_ID",
-        "EDITOR_MANIFESTATION_ID",
-        "CORRECTOR_MANIFESTATION_ID",
-        "SPONSOR_MANIFESTATION_ID",
-        "OWNER_OF_ITEM_ID",
-        "OWNERSHIP_OF_VISUAL_ID",
-        "INSCRIBER_VISUAL_ID",
-        "SENDER_VISUAL_ID",
-        "RECIPIENT_VISUAL_ID",
-        "OWNERSHIP_OF_PHYSICAL_OBJECT_ID",
-        "CREATOR_OF_PHYSICAL_OBJECT_ID",
-    }
-    
     # Check if the column is in the dynamic set or has a specific suffix.
-    if column_name.endswith(("_MENTIONING", "_MENTIONED_BY", "_HYPOTHESIS_OF")) or \
-       column_name in dynamically_typed_columns:
-        # Make the check case-insensitive to handle prefixes like "P_" or "p_"
-        str_value_lower = str_value.lower()
-        for prefix, entity_type in prefix_map.items():
-            if str_value_lower.startswith(prefix.lower()):
-                return entity_type
+    if column_name in DYNAMICALLY_TYPED_COLUMNS or column_name.endswith(DYNAMICALLY_TYPED_SUFFIXES):
+        # The regex is case-insensitive to handle prefixes like "P_" or "p_"
+        match = _PREFIX_RE.match(str(value))
+        if match:
+            return _PREFIX_TYPES[match.group(1).lower()]
     return default_mapping.get(column_name)
 
 def collect_mapped_entities(data):
@@ -118,29 +223,36 @@ def collect_mapped_entities(data):
                 bar()
                 continue
 
-            unique_records = data[[column_name] + list(properties.get(column_name, {}))].drop_duplicates()
+            column_properties = properties.get(column_name, {})
 
-            for record in unique_records.to_dict('records'):
-                item = record.pop(column_name)
-                if pd.isnull(item):
-                    continue
-                
+            if column_properties:
+                # Only the first row of each distinct value is needed for its params,
+                # so rows are reduced per value before any dict is built.
+                sub = data[[column_name] + list(column_properties)].dropna(subset=[column_name])
+                unique_records = sub.drop_duplicates(subset=[column_name]).to_dict('records')
                 delimiter = delimited_fields.get(column_name)
-                processed_items = process_field(item, delimiter=delimiter)
-
-                for single_item in processed_items:
-                    single_item = normalize_value(single_item)
-                    if not single_item:
-                        continue
+                items = (
+                    (normalize_value(single_item), record)
+                    for record in unique_records
+                    for single_item in process_field(record[column_name], delimiter=delimiter)
+                )
+            else:
+                # Common case: no properties. The whole column is split and
+                # normalized at once, only its distinct items are visited.
+                items = ((single_item, {}) for single_item in explode_column(data, column_name).unique())
+
+            for single_item, record in items:
+                if not single_item:
+                    continue
                     
-                    entity_key = (entity_type, single_item)
-                    if entity_key not in entities:
-                        params = {
-                            f_name: normalize_value(value)
-                            for p_name, f_name in properties.get(column_name, {}).items()
-                            if (value := record.get(p_name)) and pd.notnull(value)
-                        }
-                        entities[entity_key] = {"type": entity_type, "name": single_item, "params": params}
+                entity_key = (entity_type, single_item)
+                if entity_key not in entities:
+                    params = {
+                        f_name: normalize_value(value)
+                        for p_name, f_name in column_properties.items()
+                        if (value := record.get(p_name)) and pd.notnull(value)
+                    }
+                    entities[entity_key] = {"type": entity_type, "name": single_item, "params": params}
             bar()
     return entities
 
@@ -156,20 +268,14 @@ def collect_dynamic_relation_entities(data):
         print("No dynamic relation columns found to process.")
         return {}
 
-    with alive_bar(len(data), title="Scanning dynamic columns") as bar:
-        for _, row in data.iterrows():
-            for col_name in dynamic_cols:
-                if pd.notnull(row.get(col_name)):
-                    items = process_field(row[col_name], delimiter=delimited_fields.get(col_name))
-                    for item in items:
-                        item = normalize_value(item)
-                        if not item: continue
-                        
-                        entity_type = get_dynamic_entity_type(col_name, item, column2type)
-                        if entity_type:
-                            entity_key = (entity_type, item)
-                            if entity_key not in entities:
-                                entities[entity_key] = {"type": entity_type, "name": item, "params": {}}
+    with alive_bar(len(dynamic_cols), title="Scanning dynamic columns") as bar:
+        for col_name in dynamic_cols:
+            for item in explode_column(data, col_name).unique():
+                entity_type = get_dynamic_entity_type(col_name, item, column2type)
+                if entity_type:
+                    entity_key = (entity_type, item)
+                    if entity_key not in entities:
+                        entities[entity_key] = {"type": entity_type, "name": item, "params": {}}
             bar()
             
     return entities
@@ -181,158 +287,175 @@ async def main():
     relations_filename = folder / "relations.json"
 
     logged_entities = load_json_cache(entities_filename, dict)
-    logs = load_json_cache(relations_filename, lambda: defaultdict(list))
+    logs = load_json_cache(relations_filename, lambda: defaultdict(set))
 
-    xls = pd.ExcelFile(args.path)
-    data = pd.concat([xls.parse(sheet_name) for sheet_name in xls.sheet_names], ignore_index=True)
+    data = read_workbook(args.path)
 
-    mg = mp(database["connection_string"], database["database_name"], args.user)
+    mg = mp(
+        database["connection_string"], database["database_name"], args.user,
+        pool_size=args.pool_size, concurrency=args.concurrency
+    )
     await mg.authenticate() 
 
-    print("Populating server-side caches before starting...")
-    await asyncio.gather(
-        mg.get_active_entities(),
-        mg.get_relationTypes(),
-        mg.get_relations()
-    )
-    print("Caches populated. Starting main processing.")
+    try:
+        print("Populating server-side caches before starting...")
+        await asyncio.gather(
+            mg.get_active_entities(),
+            mg.get_relationTypes(),
+            mg.get_relations()
+        )
+        print("Caches populated. Starting main processing.")
 
-    mapped_entities = collect_mapped_entities(data)
-    dynamic_entities = collect_dynamic_relation_entities(data)
+        mapped_entities = collect_mapped_entities(data)
+        dynamic_entities = collect_dynamic_relation_entities(data)
 
-    all_entities = {**dynamic_entities, **mapped_entities}
+        all_entities = {**dynamic_entities, **mapped_entities}
     
-    entities_to_process = [entity_data for entity_data in all_entities.values()]
+        # Flat (type, name) -> ObjectId lookup for the relation loops. The nested
+        # logged_entities structure holds the string ids and is only kept for the JSON cache.
+        id_by_key = {
+            (entity_type, name): ObjectId(entity_id_str)
+            for entity_type, sub in logged_entities.items()
+            for name, entity_id_str in sub.items()
+        }
+
+        # Entities already in the entities.json cache (stored under their display type,
+        # the same key all_entities uses) are skipped without a database round-trip.
+        # This is not a pure optimisation: the cache is not keyed by user, so skipped
+        # entities do not get the current user added to associatedUsers (nor an audit
+        # record), and changed params are ignored. --no-cache-skip re-checks them all.
+        if args.no_cache_skip:
+            entities_to_process = list(all_entities.values())
+        else:
+            entities_to_process = [
+                entity_data for entity_key, entity_data in all_entities.items()
+                if entity_key not in id_by_key
+            ]
+        skipped = len(all_entities) - len(entities_to_process)
     
-    print(f"\nCollected {len(entities_to_process)} unique entities from the source file.")
-    print("The script will now check each entity against the database and skip any duplicates.")
-
-    if entities_to_process:
-        with alive_bar(len(entities_to_process), title="Processing entities...") as bar:
-            for i in range(0, len(entities_to_process), BATCH_SIZE):
-                batch = entities_to_process[i:i + BATCH_SIZE]
-                tasks = [mg.merge_entity(e["type"], e["name"], params=e["params"]) for e in batch]
-                results = await asyncio.gather(*tasks)
+        print(f"\nCollected {len(all_entities)} unique entities from the source file.")
+        if skipped:
+            print(f"{skipped} of them are already in {entities_filename.name} and are NOT re-checked against the database: "
+                  f"'{args.user}' is not added to their associatedUsers and changed params are ignored. "
+                  "Use --no-cache-skip to re-check them.")
+        print("The script will now check each remaining entity against the database and skip any duplicates.")
+
+        if entities_to_process:
+            with alive_bar(len(entities_to_process), title="Processing entities...") as bar:
+                for i in range(0, len(entities_to_process), BATCH_SIZE):
+                    batch = entities_to_process[i:i + BATCH_SIZE]
+                    results = await mg.bulk_merge_entities(batch)
                 
-                for entity_data, entity_id in zip(batch, results):
-                    if entity_id:
-                        entity_type = entity_data["type"]
-                        name = entity_data["name"]
-                        str_entity_id = str(entity_id)
-                        if entity_type not in logged_entities:
-                            logged_entities[entity_type] = {}
-                        logged_entities[entity_type][name] = str_entity_id
-                    bar()
-
-    with open(entities_filename, "w") as outfile:
-        json.dump(dict(logged_entities), outfile, indent=4)
-    print("Entity processing complete. Cache saved.")
-
-    relations_to_create = []
+                    for entity_data, entity_id in zip(batch, results):
+                        if entity_id:
+                            entity_type = entity_data["type"]
+                            name = entity_data["name"]
+                            str_entity_id = str(entity_id)
+                            if entity_type not in logged_entities:
+                                logged_entities[entity_type] = {}
+                            logged_entities[entity_type][name] = str_entity_id
+                            id_by_key[(entity_type, name)] = entity_id
+                        bar()
+
+        dump_json_cache(entities_filename, dict(logged_entities))
+        print("Entity processing complete. Cache saved.")
+
+        # Duplicates collapse on insertion. ObjectIds order like their hex strings,
+        # so they can be sorted on directly.
+        relations_to_create = set()
     
-    print("Collecting statically-defined relations from source file...")
-    for _, row in data.iterrows():
+        relation_cols = {r["entity1"] for r in relations} | {r["entity2"] for r in relations}
+        dynamic_rel_cols = ["PERSON_CHARACTER_ID_A", "RELATIONSHIP", "PERSON_CHARACTER_ID_B"]
+        exploded = {
+            col: explode_column(data, col)
+            for col in relation_cols | {"PERSON_CHARACTER_ID_A", "PERSON_CHARACTER_ID_B"}
+            if col in data.columns
+        }
+
+        # Both relation kinds are gathered as (name, col1, col2, e1, e2, is_dynamic)
+        # candidate rows so that a single pass resolves all of them.
+        candidate_frames = []
+
+        print("Collecting statically-defined relations from source file...")
         for r in relations:
             relation_name, col1, col2 = r["name"], r["entity1"], r["entity2"]
-            if pd.notnull(row.get(col1)) and pd.notnull(row.get(col2)):
-                entities1 = process_field(row[col1], delimiter=delimited_fields.get(col1))
-                entities2 = process_field(row[col2], delimiter=delimited_fields.get(col2))
-
-                entities1 = [normalize_value(e) for e in entities1]
-                entities2 = [normalize_value(e) for e in entities2]
-
-                for e1 in entities1:
-                    for e2 in entities2:
-                        if not e1 or not e2: continue
-
-                        e1_display_type = get_dynamic_entity_type(col1, e1, column2type)
-                        e2_display_type = get_dynamic_entity_type(col2, e2, column2type)
-
-                        if not e1_display_type or not e2_display_type:
-                            continue
-                        
-                        # This lookup was failing because of accent mismatch. 
-                        # Now that normalize_value uses NFC, this should work.
-                        entity1_id_str = logged_entities.get(e1_display_type, {}).get(e1)
-                        entity2_id_str = logged_entities.get(e2_display_type, {}).get(e2)
-
-                        if entity1_id_str and entity2_id_str:
-                            entity1_id = ObjectId(entity1_id_str)
-                            entity2_id = ObjectId(entity2_id_str)
-                            rel_tuple = (
-                                relation_name,
-                                mg.active_entities[e1_display_type],
-                                mg.active_entities[e2_display_type],
-                                entity1_id,
-                                entity2_id
-                            )
-                            relations_to_create.append(rel_tuple)
-
-    print("Collecting dynamically-named relationships from source file...")
-    dynamic_rel_cols = ["PERSON_CHARACTER_ID_A", "RELATIONSHIP", "PERSON_CHARACTER_ID_B"]
-    if all(c in data.columns for c in dynamic_rel_cols):
-        for _, row in data.iterrows():
-            if all(pd.notnull(row.get(c)) for c in dynamic_rel_cols):
-                
-                relation_name = normalize_value(row["RELATIONSHIP"])
-                col1, col2 = "PERSON_CHARACTER_ID_A", "PERSON_CHARACTER_ID_B"
-
-                entities1 = process_field(row[col1], delimiter=delimited_fields.get(col1))
-                entities2 = process_field(row[col2], delimiter=delimited_fields.get(col2))
-
-                entities1 = [normalize_value(e) for e in entities1]
-                entities2 = [normalize_value(e) for e in entities2]
-
-                for e1 in entities1:
-                    for e2 in entities2:
-                        if not e1 or not e2: continue
-
-                        e1_display_type = get_dynamic_entity_type(col1, e1, column2type)
-                        e2_display_type = get_dynamic_entity_type(col2, e2, column2type)
-
-                        if not e1_display_type or not e2_display_type:
-                            print(f"Warning: Could not determine type for dynamic relation between '{e1}' and '{e2}'. Skipping.")
-                            continue
-                        
-                        entity1_id_str = logged_entities.get(e1_display_type, {}).get(e1)
-                        entity2_id_str = logged_entities.get(e2_display_type, {}).get(e2)
-
-                        if entity1_id_str and entity2_id_str:
-                            entity1_id = ObjectId(entity1_id_str)
-                            entity2_id = ObjectId(entity2_id_str)
-                            rel_tuple = (
-                                relation_name,
-                                mg.active_entities[e1_display_type],
-                                mg.active_entities[e2_display_type],
-                                entity1_id,
-                                entity2_id
-                            )
-                            relations_to_create.append(rel_tuple)
-    else:
-        print("Dynamic relationship columns (e.g., PERSON_CHARACTER_ID_A) not found. Skipping.")
-
-    unique_relations = sorted(list(set(relations_to_create)), key=lambda x: (x[0], str(x[3]), str(x[4])))
-    print(f"Found {len(unique_relations)} unique relations to process.")
-
-    if unique_relations:
-        with alive_bar(len(unique_relations), title="Processing relations...") as bar:
-            for i in range(0, len(unique_relations), BATCH_SIZE):
-                batch = unique_relations[i:i + BATCH_SIZE]
-                tasks = [mg.merge_relation(*r) for r in batch]
-                results = await asyncio.gather(*tasks)
-
-                for relation_data, relation_id in zip(batch, results):
-                    if relation_id:
-                        relation_name = relation_data[0]
-                        src_type = relation_data[1]
-                        str_relation_id = str(relation_id)
-                        if str_relation_id not in logs[relation_name][src_type]:
-                            logs[relation_name][src_type].append(str_relation_id)
-                    bar()
-
-    with open(relations_filename, "w") as outfile:
-        json.dump(logs, outfile, indent=4)
-    print("Relation processing complete. Cache saved.")
+            if col1 not in exploded or col2 not in exploded:
+                continue
+
+            pairs = pair_columns(exploded[col1], exploded[col2]).rename(columns={0: "e1", 1: "e2"})
+            candidate_frames.append(pairs.assign(name=relation_name, col1=col1, col2=col2, is_dynamic=False))
+
+        print("Collecting dynamically-named relationships from source file...")
+        if all(c in data.columns for c in dynamic_rel_cols):
+            col1, col2 = "PERSON_CHARACTER_ID_A", "PERSON_CHARACTER_ID_B"
+            pairs = pair_columns(
+                normalize_column(data["RELATIONSHIP"].dropna()),
+                exploded[col1],
+                exploded[col2],
+            ).rename(columns={0: "name", 1: "e1", 2: "e2"})
+            candidate_frames.append(pairs.assign(col1=col1, col2=col2, is_dynamic=True))
+        else:
+            print("Dynamic relationship columns (e.g., PERSON_CHARACTER_ID_A) not found. Skipping.")
+
+        candidate_cols = ["name", "col1", "col2", "e1", "e2", "is_dynamic"]
+        candidates = (
+            pd.concat(candidate_frames, ignore_index=True)[candidate_cols]
+            if candidate_frames else pd.DataFrame(columns=candidate_cols)
+        )
+
+        for relation_name, col1, col2, e1, e2, is_dynamic in candidates.itertuples(index=False, name=None):
+            # Static names are interned in config, this covers the RELATIONSHIP column values.
+            relation_name = sys.intern(relation_name)
+            e1_display_type = get_dynamic_entity_type(col1, e1, column2type)
+            e2_display_type = get_dynamic_entity_type(col2, e2, column2type)
+
+            if not e1_display_type or not e2_display_type:
+                if is_dynamic:
+                    print(f"Warning: Could not determine type for dynamic relation between '{e1}' and '{e2}'. Skipping.")
+                continue
+        
+            # This lookup was failing because of accent mismatch. 
+            # Now that normalize_value uses NFC, this should work.
+            entity1_id = id_by_key.get((e1_display_type, e1))
+            entity2_id = id_by_key.get((e2_display_type, e2))
+
+            if entity1_id and entity2_id:
+                rel_tuple = (
+                    relation_name,
+                    mg.active_entities[e1_display_type],
+                    mg.active_entities[e2_display_type],
+                    entity1_id,
+                    entity2_id
+                )
+                relations_to_create.add(rel_tuple)
+
+        unique_relations = sorted(relations_to_create, key=operator.itemgetter(0, 3, 4))
+        print(f"Found {len(unique_relations)} unique relations to process.")
+
+        if unique_relations:
+            with alive_bar(len(unique_relations), title="Processing relations...") as bar:
+                for i in range(0, len(unique_relations), BATCH_SIZE):
+                    batch = unique_relations[i:i + BATCH_SIZE]
+                    results = await mg.bulk_merge_relations(batch)
+
+                    for relation_data, relation_id in zip(batch, results):
+                        if relation_id:
+                            relation_name = relation_data[0]
+                            src_type = relation_data[1]
+                            str_relation_id = str(relation_id)
+                            logs[relation_name][src_type].add(str_relation_id)
+                        bar()
+
+        # Machine-read cache only, so it is written without indentation.
+        dump_json_cache(
+            relations_filename,
+            {k: {t: sorted(v) for t, v in sub.items()} for k, sub in logs.items()},
+            indent=False
+        )
+        print("Relation processing complete. Cache saved.")
+    finally:
+        # Flush the queued audit logs even if the import fails part-way.
+        await mg.close()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,27 @@
 # START OF FILE cli.py
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
+
+from mango.db_handler import DEFAULT_POOL_SIZE, DEFAULT_CONCURRENCY
+
+
+def positive_int(value):
+    """argparse type for options that must be at least 1."""
+    number = int(value)
+    if number <= 0:
+        raise ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
 
 parser = ArgumentParser(prog="era", usage="Provide a path to the excel file to convert and the username.")
 parser.add_argument("path")
 # Add a required argument for the username
 parser.add_argument("--user", required=True, help="The username from the 'users' collection to associate with the import.")
+# Entities found in output/entities.json are skipped by default, this sends them to the database again.
+parser.add_argument("--no-cache-skip", action="store_true", help="Re-check entities already in output/entities.json against the database, e.g. when importing as a different user or with changed properties.")
+# Optional tuning of the MongoDB connection pool and of how many tasks query it at once.
+parser.add_argument("--pool-size", type=positive_int, default=DEFAULT_POOL_SIZE, help="Maximum number of MongoDB connections in the pool.")
+parser.add_argument("--concurrency", type=positive_int, default=DEFAULT_CONCURRENCY,
+                    help="Maximum number of per-collection groups of a bulk entity merge (and of single "
+                         "merge_entity/merge_relation calls) sent to MongoDB at once. Bulk relation merges are not limited by it.")
 args = parser.parse_args()
\ No newline at end of file
@@ -1,5 +1,6 @@
 # START OF FILE config.py
 
+import sys
 from pathlib import Path
 import tomllib
 
@@ -11,11 +12,14 @@ with open(path, mode="rb") as fb:
 #server = rules["server"]
 # Add this line to load database configuration
 database = rules["database"] 
-column2type = rules["mapping"]
 properties = rules["properties"]
-relations = rules["relations"]
 delimited_fields = rules["delimited_fields"]
 
+# Entity types and relation names end up in millions of dict/set key tuples,
+# interning them lets those comparisons short-circuit on identity.
+column2type = {column: sys.intern(entity_type) for column, entity_type in rules["mapping"].items()}
+relations = [{**r, "name": sys.intern(r["name"])} for r in rules["relations"]]
+
 # Defines rules for dynamic entity typing based on value prefixes.
 # The key is the prefix, and the value is the entity type to assign.
 
@@ -1,18 +1,54 @@
 # START OF FILE db_handler.py
 
+import sys
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 from bson import ObjectId
 from datetime import datetime, timezone
 from collections import defaultdict # Import defaultdict
+from collections.abc import Hashable
+
+# Audit logs are written in the background, in batches of up to AUDIT_BATCH_SIZE
+# documents or whatever arrived within AUDIT_FLUSH_INTERVAL seconds.
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 0.2
+
+# Connection pool size and the number of tasks allowed to talk to the database at once.
+# Both can be tuned per deployment with --pool-size and --concurrency.
+DEFAULT_POOL_SIZE = 500
+DEFAULT_CONCURRENCY = 256
+
+
+def _field_keys(value):
+    """
+    The values an equality query on this field can match, as MongoDB sees them:
+    the value itself, or every hashable element when the field holds an array.
+    """
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, Hashable)]
+    return [value] if isinstance(value, Hashable) else []
+
+
+def _field_matches(doc_value, value):
+    """
+    MongoDB equality: an array field also matches any of its elements.
+    """
+    return doc_value == value or (isinstance(doc_value, list) and value in doc_value)
 
 class MongoDirect:
     """
     Handles direct interaction with the MongoDB database.
     This version includes a lock to prevent race conditions when creating relation types.
     """
-    def __init__(self, connection_string, database_name, username):
-        self.client = AsyncIOMotorClient(connection_string)
+    def __init__(self, connection_string, database_name, username,
+                 pool_size=DEFAULT_POOL_SIZE, concurrency=DEFAULT_CONCURRENCY):
+        self.client = AsyncIOMotorClient(
+            connection_string,
+            maxPoolSize=pool_size,
+            minPoolSize=min(50, pool_size),
+            maxIdleTimeMS=60000
+        )
         self.db = self.client[database_name]
         self.username = username
         self.user_id = None
@@ -20,6 +56,13 @@ class MongoDirect:
         # FIX: A dictionary of locks to prevent race conditions.
         # Each key will be a unique relation type, and the value will be a lock.
         self.relation_type_locks = defaultdict(asyncio.Lock)
+
+        # Keeps an unbounded asyncio.gather from queueing more work than the pool can serve.
+        self.db_semaphore = asyncio.Semaphore(concurrency)
+
+        # Audit docs are queued here and flushed by _audit_worker.
+        self._audit_queue = asyncio.Queue()
+        self._audit_task = None
         
         self.collection_map = {
             "persons": self.db.persons,
@@ -55,12 +98,8 @@ class MongoDirect:
             "event": "title"
         }
 
-    async def _log_audit(self, reference_id, path, value, op_type="post"):
-        if not self.user_id:
-            print("Warning: Cannot create audit log without a user context.")
-            return
-
-        audit_doc = {
+    def _audit_doc(self, reference_id, path, value, op_type="post"):
+        return {
             "referenceId": reference_id,
             "user": self.user_id,
             "timestamp": datetime.now(timezone.utc),
@@ -69,10 +108,63 @@ class MongoDirect:
             "type": op_type,
             "__v": 0
         }
-        try:
-            await self.db.audits.insert_one(audit_doc)
-        except Exception as e:
-            print(f"Warning: Failed to create audit log for {reference_id}. Error: {e}")
+
+    def _log_audit(self, reference_id, path, value, op_type="post"):
+        if not self.user_id:
+            print("Warning: Cannot create audit log without a user context.")
+            return
+
+        self._audit_queue.put_nowait(self._audit_doc(reference_id, path, value, op_type))
+
+    def _log_audits(self, audit_docs):
+        """
+        Queues the audit logs of a whole batch.
+        """
+        if not audit_docs:
+            return
+        if not self.user_id:
+            print("Warning: Cannot create audit log without a user context.")
+            return
+
+        for audit_doc in audit_docs:
+            self._audit_queue.put_nowait(audit_doc)
+
+    async def _audit_worker(self):
+        """
+        Background task that drains the audit queue and writes it with insert_many.
+        Audits are write-only, so nothing waits for them except close().
+        """
+        while True:
+            batch = [await self._audit_queue.get()]
+            if self._audit_queue.qsize() < AUDIT_BATCH_SIZE - 1:
+                # Give the queue a moment to fill up before paying for a round-trip.
+                await asyncio.sleep(AUDIT_FLUSH_INTERVAL)
+            while len(batch) < AUDIT_BATCH_SIZE and not self._audit_queue.empty():
+                batch.append(self._audit_queue.get_nowait())
+
+            try:
+                await self.db.audits.insert_many(batch, ordered=False)
+            except Exception as e:
+                print(f"Warning: Failed to create {len(batch)} audit logs. Error: {e}")
+            finally:
+                for _ in batch:
+                    self._audit_queue.task_done()
+
+    async def close(self):
+        """
+        Flushes the pending audit logs and stops the background writer.
+        """
+        if self._audit_task is not None:
+            await self._audit_queue.join()
+            self._audit_task.cancel()
+            try:
+                await self._audit_task
+            except asyncio.CancelledError:
+                pass
+            self._audit_task = None
+        elif not self._audit_queue.empty():
+            batch = [self._audit_queue.get_nowait() for _ in range(self._audit_queue.qsize())]
+            await self.db.audits.insert_many(batch, ordered=False)
 
     async def _set_user_context(self):
         user_doc = await self.db.users.find_one({"username": self.username})
@@ -84,24 +176,49 @@ class MongoDirect:
     async def authenticate(self, user=None, password=None):
         await self.db.command('ping')
         await self._set_user_context()
+        await self.get_types()
+        await self.get_users()
+        if self._audit_task is None:
+            self._audit_task = asyncio.create_task(self._audit_worker())
         print("Successfully connected to MongoDB and set user context.")
 
+    async def get_types(self):
+        # Types are static during an import, so they are read once instead of per entity/relation.
+        cursor = self.db.types.find({}, {"_id": 1, "name": 1}).batch_size(1000)
+        self.type_id_by_name = {
+            t["name"]: t["_id"]
+            async for t in cursor
+        }
+
+    async def get_users(self):
+        # Persons that are also users resolve to the user document, read once here
+        # instead of one users lookup per person entity.
+        cursor = self.db.users.find({}, {"_id": 1, "username": 1}).batch_size(2000)
+        self._user_id_by_name = {
+            u["username"]: u["_id"]
+            async for u in cursor if "username" in u
+        }
+
     async def get_active_entities(self):
-        cursor = self.db.types.find({"active": True})
+        cursor = self.db.types.find({"active": True}, {"displayName": 1, "name": 1}).batch_size(1000)
         self.active_entities = {
-            e["displayName"].lower(): e["name"]
+            e["displayName"].lower(): sys.intern(e["name"])
             async for e in cursor
         }
 
     async def get_relationTypes(self):
-        cursor = self.db.relationtypes.find({})
+        cursor = self.db.relationtypes.find({}, {"_id": 1, "name": 1, "type": 1, "relationType": 1}).batch_size(5000)
         self.relation_types = {
             (r["name"], str(r["type"]), str(r["relationType"])): r["_id"]
             async for r in cursor if r.get("type") and r.get("relationType")
         }
 
     async def get_relations(self):
-        cursor = self.db.relations.find({})
+        # Only the fields of the cache key are fetched, in large batches: this
+        # collection can hold millions of documents and is read in full at startup.
+        cursor = self.db.relations.find(
+            {}, {"_id": 1, "entity1": 1, "entity2": 1, "relationType": 1}
+        ).batch_size(5000)
         self.relations = {
             str(rel["entity1"]) + str(rel["entity2"]) + str(rel["relationType"]): rel["_id"]
             async for rel in cursor if all(k in rel for k in ["entity1", "entity2", "relationType"])
@@ -112,7 +229,30 @@ class MongoDirect:
         doc = await collection.find_one(params_dict)
         return doc['_id'] if doc else None
 
+    def _new_entity_doc(self, entity_type, collection, query_params):
+        now = datetime.now(timezone.utc)
+        new_doc = {
+            "active": True, "creationUser": self.user_id, "updateUser": self.user_id,
+            "creationTimestamp": now, "latestUpdateTimestamp": now,
+            "namespace": "interfolia", "__v": 0, 
+            "associatedUsers": [self.user_id], # Initialize with the creator's ID
+            **query_params
+        }
+        
+        if entity_type == "persons":
+            new_doc["measures"] = []
+        elif entity_type in ["institutions", "events"] or collection == self.default_collection:
+            new_doc["relations"] = []
+        return new_doc
+
+    async def _bounded(self, coro):
+        async with self.db_semaphore:
+            return await coro
+
     async def merge_entity(self, display_name, entity_name, params=None):
+        return await self._bounded(self._merge_entity(display_name, entity_name, params))
+
+    async def _merge_entity(self, display_name, entity_name, params=None):
         if not hasattr(self, "active_entities"):
             await self.get_active_entities()
 
@@ -124,9 +264,11 @@ class MongoDirect:
             return None
 
         if entity_type == 'persons':
-            user_doc = await self.db.users.find_one({"username": entity_name})
-            if user_doc:
-                return user_doc['_id']
+            if not hasattr(self, "_user_id_by_name"):
+                await self.get_users()
+            uid = self._user_id_by_name.get(entity_name)
+            if uid:
+                return uid
 
         collection = self.collection_map.get(entity_type, self.default_collection)
         field_name = self.predefined.get(display_name_lower, "description")
@@ -146,49 +288,34 @@ class MongoDirect:
                         "$set": {"updateUser": self.user_id, "latestUpdateTimestamp": datetime.now(timezone.utc)}
                     }
                 )
-                await self._log_audit(existing_doc["_id"], "associatedUsers", str(self.user_id), op_type="update")
+                self._log_audit(existing_doc["_id"], "associatedUsers", str(self.user_id), op_type="update")
             return existing_doc["_id"]
 
         # If the entity does not exist, create it with the current user as the creator and associated user.
-        now = datetime.now(timezone.utc)
-        new_doc = {
-            "active": True, "creationUser": self.user_id, "updateUser": self.user_id,
-            "creationTimestamp": now, "latestUpdateTimestamp": now,
-            "namespace": "interfolia", "__v": 0, 
-            "associatedUsers": [self.user_id], # Initialize with the creator's ID
-            **query_params
-        }
-        
-        if entity_type == "persons":
-            new_doc["measures"] = []
-        elif entity_type in ["institutions", "events"] or collection == self.default_collection:
-            new_doc["relations"] = []
+        new_doc = self._new_entity_doc(entity_type, collection, query_params)
         
-        type_doc = await self.db.types.find_one({"name": entity_type})
-        if type_doc:
-            new_doc["type"] = type_doc["_id"]
+        if not hasattr(self, "type_id_by_name"):
+            await self.get_types()
+        type_id = self.type_id_by_name.get(entity_type)
+        if type_id:
+            new_doc["type"] = type_id
 
         result = await collection.insert_one(new_doc)
         inserted_id = result.inserted_id
-        await self._log_audit(inserted_id, field_name, entity_name, op_type="post")
+        self._log_audit(inserted_id, field_name, entity_name, op_type="post")
         return inserted_id
 
-    async def merge_relation(self, relation_name, src_type, trg_type, entity1_id, entity2_id):
-        if not hasattr(self, "relation_types"):
-            await self.get_relationTypes()
-
-        src_type_doc = await self.db.types.find_one({"name": src_type})
-        trg_type_doc = await self.db.types.find_one({"name": trg_type})
-
-        if not src_type_doc or not trg_type_doc:
-            return None
-        
-        src_type_id, trg_type_id = src_type_doc["_id"], trg_type_doc["_id"]
-
+    async def _get_relation_type_id(self, relation_name, src_type_id, trg_type_id):
         rel_type_key = (relation_name, str(src_type_id), str(trg_type_id))
+
+        # Common case after warm-up: the type is cached, no lock needed.
+        relation_type_id = self.relation_types.get(rel_type_key)
+        if relation_type_id:
+            return relation_type_id
         
         # FIX: Use a lock to ensure only one task can create a new relation type at a time.
         async with self.relation_type_locks[rel_type_key]:
+            # Double-check: another task may have created it while we were waiting.
             relation_type_id = self.relation_types.get(rel_type_key)
 
             if not relation_type_id:
@@ -200,10 +327,33 @@ class MongoDirect:
                 }
                 result = await self.db.relationtypes.insert_one(rel_type_doc)
                 relation_type_id = result.inserted_id
-                await self._log_audit(relation_type_id, "name", relation_name, op_type="post")
+                self._log_audit(relation_type_id, "name", relation_name, op_type="post")
                 # Update the shared cache so other waiting tasks can see the new ID.
                 self.relation_types[rel_type_key] = relation_type_id
 
+        # Once cached, the fast path above never needs this lock again.
+        self.relation_type_locks.pop(rel_type_key, None)
+        return relation_type_id
+
+    async def merge_relation(self, relation_name, src_type, trg_type, entity1_id, entity2_id):
+        return await self._bounded(
+            self._merge_relation(relation_name, src_type, trg_type, entity1_id, entity2_id)
+        )
+
+    async def _merge_relation(self, relation_name, src_type, trg_type, entity1_id, entity2_id):
+        if not hasattr(self, "relation_types"):
+            await self.get_relationTypes()
+        if not hasattr(self, "type_id_by_name"):
+            await self.get_types()
+
+        src_type_id = self.type_id_by_name.get(src_type)
+        trg_type_id = self.type_id_by_name.get(trg_type)
+
+        if not src_type_id or not trg_type_id:
+            return None
+
+        relation_type_id = await self._get_relation_type_id(relation_name, src_type_id, trg_type_id)
+
         if not hasattr(self, "relations"):
             await self.get_relations()
             
@@ -218,7 +368,171 @@ class MongoDirect:
         
         result = await self.db.relations.insert_one(relation_doc)
         relation_id = result.inserted_id
-        await self._log_audit(relation_id, "active", True, op_type="post")
+        self._log_audit(relation_id, "active", True, op_type="post")
         # Update the shared cache for relations as well.
         self.relations[rel_key] = relation_id
-        return relation_id
\ No newline at end of file
+        return relation_id
+
+    async def bulk_merge_entities(self, batch):
+        """
+        Batched counterpart of merge_entity. Takes the entity dicts collected by
+        __main__ ({"type", "name", "params"}) and returns their ids in the same order.
+
+        Instead of several round-trips per entity it issues one find per
+        collection, one bulk_write for the associatedUsers updates, one
+        insert_many per collection for the new documents and one insert_many
+        for the audit logs.
+        """
+        if not hasattr(self, "active_entities"):
+            await self.get_active_entities()
+
+        results = [None] * len(batch)
+        audit_docs = []
+
+        if not hasattr(self, "_user_id_by_name"):
+            await self.get_users()
+
+        # Group the remaining entities by (entity_type, field_name), the same query
+        # shape merge_entity would use. Identical queries share a single slot.
+        groups = defaultdict(dict)
+        for i, e in enumerate(batch):
+            display_name_lower = e["type"].lower()
+            entity_type = self.active_entities.get(display_name_lower)
+            if not entity_type:
+                continue
+            # Persons that are also users resolve to the user document.
+            if entity_type == "persons" and e["name"] in self._user_id_by_name:
+                results[i] = self._user_id_by_name[e["name"]]
+                continue
+
+            field_name = self.predefined.get(display_name_lower, "description")
+            query_params = (e.get("params") or {}).copy()
+            query_params[field_name] = e["name"]
+
+            query_key = tuple(sorted(query_params.items()))
+            slot = groups[(entity_type, field_name)].setdefault(query_key, {"query": query_params, "indexes": []})
+            slot["indexes"].append(i)
+
+        if not hasattr(self, "type_id_by_name"):
+            await self.get_types()
+
+        # Groups target different collections, so their round-trips can overlap.
+        await asyncio.gather(*(
+            self._bounded(self._bulk_merge_group(entity_type, field_name, slots, results, audit_docs))
+            for (entity_type, field_name), slots in groups.items()
+        ))
+
+        self._log_audits(audit_docs)
+        return results
+
+    async def _bulk_merge_group(self, entity_type, field_name, slots, results, audit_docs):
+        """
+        Merges the entities of one (entity_type, field_name) group for bulk_merge_entities,
+        filling in results and audit_docs.
+        """
+        collection = self.collection_map.get(entity_type, self.default_collection)
+
+        # One lookup for the whole group, the remaining params are matched locally.
+        names = list({slot["query"][field_name] for slot in slots.values()})
+        fields = {k for slot in slots.values() for k in slot["query"]}
+        projection = {"_id": 1, "associatedUsers": 1, **{k: 1 for k in fields}}
+        candidates = defaultdict(list)
+        async for doc in collection.find({field_name: {"$in": names}}, projection):
+            # $in also returns documents whose name field is an array holding the name.
+            for key in _field_keys(doc.get(field_name)):
+                candidates[key].append(doc)
+
+        updates = []
+        new_slots, new_docs = [], []
+        now = datetime.now(timezone.utc)
+        for slot in slots.values():
+            query = slot["query"]
+            existing_doc = next(
+                (doc for doc in candidates.get(query[field_name], [])
+                 if all(_field_matches(doc.get(k), v) for k, v in query.items())),
+                None
+            )
+
+            if existing_doc:
+                entity_id = existing_doc["_id"]
+                # Entity exists. Add the current user to the list of associated users if not already present.
+                if self.user_id not in existing_doc.get("associatedUsers", []):
+                    updates.append(UpdateOne(
+                        {"_id": entity_id},
+                        {
+                            "$addToSet": {"associatedUsers": self.user_id},
+                            "$set": {"updateUser": self.user_id, "latestUpdateTimestamp": now}
+                        }
+                    ))
+                    audit_docs.append(self._audit_doc(entity_id, "associatedUsers", str(self.user_id), op_type="update"))
+                for i in slot["indexes"]:
+                    results[i] = entity_id
+                continue
+
+            new_doc = self._new_entity_doc(entity_type, collection, query)
+            type_id = self.type_id_by_name.get(entity_type)
+            if type_id:
+                new_doc["type"] = type_id
+            new_slots.append(slot)
+            new_docs.append(new_doc)
+
+        if updates:
+            await collection.bulk_write(updates, ordered=False)
+
+        if new_docs:
+            result = await collection.insert_many(new_docs, ordered=False)
+            for slot, inserted_id in zip(new_slots, result.inserted_ids):
+                audit_docs.append(self._audit_doc(inserted_id, field_name, slot["query"][field_name], op_type="post"))
+                for i in slot["indexes"]:
+                    results[i] = inserted_id
+
+    async def bulk_merge_relations(self, batch):
+        """
+        Batched counterpart of merge_relation. Takes (relation_name, src_type,
+        trg_type, entity1_id, entity2_id) tuples and returns the relation ids in
+        the same order. Relations already in the cache are resolved locally and
+        the misses are created with one insert_many.
+        """
+        if not hasattr(self, "relation_types"):
+            await self.get_relationTypes()
+        if not hasattr(self, "relations"):
+            await self.get_relations()
+        if not hasattr(self, "type_id_by_name"):
+            await self.get_types()
+
+        results = [None] * len(batch)
+        misses = {}
+        for i, (relation_name, src_type, trg_type, entity1_id, entity2_id) in enumerate(batch):
+            src_type_id = self.type_id_by_name.get(src_type)
+            trg_type_id = self.type_id_by_name.get(trg_type)
+            if not src_type_id or not trg_type_id:
+                continue
+
+            relation_type_id = await self._get_relation_type_id(relation_name, src_type_id, trg_type_id)
+
+            rel_key = str(entity1_id) + str(entity2_id) + str(relation_type_id)
+            if rel_key in self.relations:
+                results[i] = self.relations[rel_key]
+                continue
+
+            slot = misses.setdefault(rel_key, {
+                "doc": {
+                    "active": True, "entity1": entity1_id, "relationType": relation_type_id,
+                    "entity2": entity2_id, "__v": 0
+                },
+                "indexes": []
+            })
+            slot["indexes"].append(i)
+
+        if misses:
+            result = await self.db.relations.insert_many([slot["doc"] for slot in misses.values()], ordered=False)
+            audit_docs = []
+            for (rel_key, slot), relation_id in zip(misses.items(), result.inserted_ids):
+                audit_docs.append(self._audit_doc(relation_id, "active", True, op_type="post"))
+                # Update the shared cache for relations as well.
+                self.relations[rel_key] = relation_id
+                for i in slot["indexes"]:
+                    results[i] = relation_id
+            self._log_audits(audit_docs)
+
+        return results
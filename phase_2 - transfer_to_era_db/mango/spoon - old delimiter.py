@@ -1,6 +1,5 @@
 import re
 import itertools
-import numpy as np
 
 def process_field(field, delimiter, lower=False, pattern=None):
     """
@@ -12,6 +11,10 @@ def process_field(field, delimiter, lower=False, pattern=None):
     if not isinstance(field, list):
         field = [field]
 
+    # Fast path: a single value without a delimiter needs no further processing.
+    if delimiter is None and len(field) == 1:
+        return [str(field[0])]
+
     # 2. Convert all items in the list to strings. This is the key fix that
     # prevents errors when pandas provides numbers (floats/ints) instead of text.
     string_field = [str(item) for item in field]
@@ -29,7 +32,7 @@ def process_field(field, delimiter, lower=False, pattern=None):
                 )
             )
         )
-        return np.array(list(processed_items))
+        return list(processed_items)
     
     # If no delimiter is specified, just return the stringified items.
-    return np.array(string_field)
\ No newline at end of file
+    return string_field
\ No newline at end of file
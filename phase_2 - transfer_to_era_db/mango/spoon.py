@@ -1,6 +1,39 @@
 import re
 import itertools
-import numpy as np
+from functools import lru_cache
+import pandas as pd
+
+# DEFINITION OF PREFIXES
+# This list controls what counts as an "ID string" vs "Regular Text".
+# Critical: Sorted by length descending.
+# This ensures 'm_vol_' is matched before 'm_', avoiding partial matches.
+ID_PREFIXES = tuple(sorted([
+    "p_", "w_", "ex_", "m_", "m_vol_", "i_", "PO_", "PO_PAG_",
+    "PAG_", "VO_", "e_", "ac_", "inst_", "loc_"
+], key=len, reverse=True))
+
+PREFIX_PATTERN = "|".join(map(re.escape, ID_PREFIXES))
+
+# Does a string START with one of the ID prefixes?
+_IS_ID_RE = re.compile(f"^(?:{PREFIX_PATTERN})")
+
+
+def smart_split_regex(delimiter):
+    """
+    Builds a regex that matches the delimiter ONLY if followed by a known prefix.
+    """
+    # FIX: Added 'r' before the f-string (rf"...") to fix the SyntaxWarning.
+    # This treats '\s' as a literal regex character rather than a failed python escape.
+    return rf"{re.escape(delimiter)}\s*(?=(?:{PREFIX_PATTERN}))"
+
+
+@lru_cache(maxsize=None)
+def _compiled(delimiter):
+    """
+    Compiles the smart split regex once per delimiter instead of once per call.
+    """
+    return re.compile(smart_split_regex(delimiter))
+
 
 def process_field(field, delimiter, lower=False, pattern=None):
     """
@@ -13,30 +46,24 @@ def process_field(field, delimiter, lower=False, pattern=None):
     if not isinstance(field, list):
         field = [field]
 
+    # Fast path: a single value without a delimiter needs no further processing.
+    if delimiter is None and len(field) == 1:
+        return [str(field[0])]
+
     # 2. Convert all items to strings.
     string_field = [str(item) for item in field]
 
     # 3. Apply the splitting logic.
     if delimiter is not None:
+        # Fast path: a single value without the delimiter has nothing to split.
+        if len(string_field) == 1 and delimiter not in string_field[0]:
+            final_part = string_field[0].strip()
+            if lower:
+                final_part = final_part.lower()
+            return [final_part] if final_part else []
+
         processed_items = set()
-        
-        # DEFINITION OF PREFIXES
-        # This list controls what counts as an "ID string" vs "Regular Text".
-        prefixes = [
-            "p_", "w_", "ex_", "m_", "m_vol_", "i_", "PO_", "PO_PAG_",
-            "PAG_", "VO_", "e_", "ac_", "inst_", "loc_"
-        ]
-        
-        # Critical: Sort by length descending. 
-        # This ensures 'm_vol_' is matched before 'm_', avoiding partial matches.
-        prefixes.sort(key=len, reverse=True)
-        
-        # Build a regex that matches the delimiter ONLY if followed by a known prefix.
-        prefix_pattern = "|".join(map(re.escape, prefixes))
-        
-        # FIX: Added 'r' before the f-string (rf"...") to fix the SyntaxWarning.
-        # This treats '\s' as a literal regex character rather than a failed python escape.
-        smart_split_regex = rf"{re.escape(delimiter)}\s*(?=(?:{prefix_pattern}))"
+        split_regex = _compiled(delimiter)
 
         for item in string_field:
             clean_item = item.strip()
@@ -44,17 +71,11 @@ def process_field(field, delimiter, lower=False, pattern=None):
                 continue
 
             # CHECK: Does this specific item START with one of your ID prefixes?
-            is_id_string = False
-            for p in prefixes:
-                if clean_item.startswith(p):
-                    is_id_string = True
-                    break
-            
-            if is_id_string:
+            if _IS_ID_RE.match(clean_item):
                 # CASE: ID STRING (e.g. "m_code(1;2)")
                 # Only split if the delimiter is followed by another valid prefix (like "m_" or "p_")
                 # This protects internal semicolons.
-                parts = re.split(smart_split_regex, clean_item)
+                parts = split_regex.split(clean_item)
             else:
                 # CASE: REGULAR TEXT (e.g. "milk; bread")
                 # Split at every delimiter regardless of what follows.
@@ -69,7 +90,33 @@ def process_field(field, delimiter, lower=False, pattern=None):
                 if final_part:
                     processed_items.add(final_part)
                     
-        return np.array(list(processed_items))
+        return list(processed_items)
     
     # If no delimiter is specified, just return the stringified items.
-    return np.array(string_field)
\ No newline at end of file
+    return string_field
+
+
+def split_series(series, delimiter, lower=False):
+    """
+    Vectorized counterpart of process_field for a whole column of strings.
+
+    Splits every cell of the Series with the same ID-aware rules and explodes
+    the parts, keeping the original row index so items can be joined back
+    to the row they came from.
+    """
+    if delimiter is None:
+        return series
+
+    series = series.str.strip()
+    is_id_string = series.str.match(_IS_ID_RE)
+
+    # ID strings only split before another prefix, regular text splits everywhere.
+    parts = pd.concat([
+        series[is_id_string].str.split(_compiled(delimiter)),
+        series[~is_id_string].str.split(delimiter, regex=False),
+    ]).explode().str.strip()
+
+    if lower:
+        parts = parts.str.lower()
+
+    return parts[parts.notna() & (parts != "")].sort_index(kind="stable")
@@ -0,0 +1,75 @@
+# START OF FILE test_normalize.py
+
+import sys
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# __main__.py parses the command line on import, give it a valid one.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.argv = ["era", "workbook.xlsx", "--user", "test"]
+spec = importlib.util.spec_from_file_location("era_main", ROOT / "__main__.py")
+era = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(era)
+
+
+def reference_items(values, delimiter):
+    """The row-by-row path: process_field followed by normalize_value."""
+    items = set()
+    for value in values:
+        if pd.isnull(value):
+            continue
+        for item in era.process_field(value, delimiter=delimiter):
+            item = era.normalize_value(item)
+            if item:
+                items.add(item)
+    return items
+
+
+def test_normalize_series_matches_normalize_value():
+    values = [
+        "p_1", " 12 ", "12.0", "2.50", "1e3", "moïse", "a\nb\t", "  ", "", None, np.nan,
+        "0012", "1.5e-7", "nan", "inf", "Infinity", "1e400", "1e309", "-inf", 5.0, 7, 2.5, "-0",
+        "53280785727277684567", "10035154247527672963", "1234567890123456789012",
+    ]
+    got = era.normalize_series(pd.Series(values, dtype=object))
+    for value, normalized in zip(values, got):
+        expected = era.normalize_value(value) or None
+        assert (None if normalized is pd.NA else normalized) == expected, value
+
+
+def test_explode_column_mixes_text_and_numbers():
+    # A delimited cell repeats its row label once per item.
+    values = ["123;456", "12;x", np.nan, 7.0, "a; 1.0", "p_1;p_2", "m_code(1;2); m_x",
+              "10035154247527672963;53280785727277684567"]
+    data = pd.DataFrame({"VIAF_CODE_PLACE": values})
+    exploded = era.explode_column(data, "VIAF_CODE_PLACE")
+    assert set(exploded) == reference_items(values, ";")
+
+
+def test_collect_mapped_entities_numeric_delimited_column():
+    values = ["123;456", "12;x", np.nan, 7.0, "1.0;2.5"]
+    data = pd.DataFrame({"VIAF_CODE_PLACE": values, "CLASSIFICATION_WORK": ["a;b", 3.0, "3;c", None, "b"]})
+    entities = era.collect_mapped_entities(data)
+
+    expected = {("place", item) for item in reference_items(values, ";")}
+    expected |= {("work", item) for item in reference_items(data["CLASSIFICATION_WORK"], ";")}
+    assert set(entities) == expected
+
+
+def test_explode_column_keeps_the_time_of_dates():
+    # A datetime64 column where every value is at midnight must still be
+    # stringified per cell, like process_field does, not as bare dates.
+    dates = pd.Series(pd.to_datetime(["1950-03-01", None, "1960-07-14"]))
+    data = pd.DataFrame({"DATE_OF_EVENT": dates})
+    exploded = era.explode_column(data, "DATE_OF_EVENT")
+    assert set(exploded) == {"1950-03-01 00:00:00", "1960-07-14 00:00:00"}
+    assert set(exploded) == reference_items(dates, era.delimited_fields.get("DATE_OF_EVENT"))
+
+
+def test_explode_column_of_empty_cells():
+    data = pd.DataFrame({"VIAF_CODE_PLACE": [np.nan, np.nan]})
+    assert era.explode_column(data, "VIAF_CODE_PLACE").empty